@@ -8,11 +8,22 @@ import json
 import traceback
 import logging
 import inspect
-from typing import Optional, Any, Callable, Dict, List
-from flask import Flask, request, jsonify
+import functools
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Optional, Any, Callable, Dict, List, Tuple
+from flask import Flask, Response, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 from flask_cors import CORS
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
 load_dotenv()
 
 # --------------------
@@ -26,6 +37,10 @@ MODEL_TEMPERATURE = float(os.getenv("MODEL_TEMPERATURE", "0.75"))
 FALLBACK_REPLY = os.getenv("FALLBACK_REPLY", "false").lower() in ("1", "true", "yes")
 DEBUG_MODE = os.getenv("DEBUG", "true").lower() in ("1", "true", "yes")
 LOGFILE = os.getenv("LOGFILE", "server.log")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "900"))
+INFLIGHT_WAIT_TIMEOUT = float(os.getenv("INFLIGHT_WAIT_TIMEOUT", "120"))
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "32"))
 
 # --------------------
 # Logging
@@ -46,21 +61,78 @@ logger.info("Starting provider-only inference app. provider=%s token_set=%s defa
             HF_INFERENCE_PROVIDER, bool(HF_TOKEN), DEFAULT_MODEL)
 
 app = Flask(__name__)
+if orjson is not None:
+    from flask import current_app
+    from flask.json.provider import DefaultJSONProvider
+
+    class OrjsonProvider(DefaultJSONProvider):
+        """
+        orjson-backed JSON provider: jsonify and request.get_json use orjson; values orjson can't
+        encode natively go through Flask's default handler. Output is always UTF-8 (never ASCII-escaped).
+        """
+        def dumps(self, obj: Any, **kwargs: Any) -> str:
+            kwargs.setdefault("sort_keys", self.sort_keys)
+            option = orjson.OPT_NON_STR_KEYS
+            if kwargs.pop("sort_keys"):
+                option |= orjson.OPT_SORT_KEYS
+            indent = kwargs.pop("indent", None)
+            if indent == 2:
+                option |= orjson.OPT_INDENT_2
+            elif indent is not None:
+                raise TypeError(f"OrjsonProvider supports indent=None or 2, not {indent!r}")
+            if kwargs.pop("ensure_ascii", False):
+                raise TypeError("OrjsonProvider does not support ensure_ascii=True")
+            # orjson output is already compact (Flask's session serializer asks for this)
+            separators = kwargs.pop("separators", None)
+            if separators is not None and tuple(separators) != (",", ":"):
+                raise TypeError(f"OrjsonProvider only supports compact separators, not {separators!r}")
+            default = kwargs.pop("default", self.default)
+            if kwargs:
+                raise TypeError(f"OrjsonProvider.dumps got unsupported arguments: {', '.join(sorted(kwargs))}")
+            return orjson.dumps(obj, default=default, option=option).decode("utf-8")
+
+        def loads(self, s: Any, **kwargs: Any) -> Any:
+            if kwargs:
+                raise TypeError(f"OrjsonProvider.loads got unsupported arguments: {', '.join(sorted(kwargs))}")
+            return orjson.loads(s)
+
+        def response(self, *args: Any, **kwargs: Any):
+            if args and kwargs:
+                raise TypeError("app.json.response() takes either args or kwargs, not both")
+            if not args and not kwargs:
+                obj = None
+            elif len(args) == 1:
+                obj = args[0]
+            else:
+                obj = args or kwargs
+            return current_app.response_class(f"{self.dumps(obj)}\n", mimetype=self.mimetype)
+
+    app.json = OrjsonProvider(app)
 CORS(app)
 app.config["JSONIFY_PRETTYPRINT_REGULAR"] = False
 
 # --------------------
 # Safety / prompts
 # --------------------
+# Single alternation compiled at import: one scan per message instead of one per phrase.
 CRISIS_PATTERNS = [
-    re.compile(r"\bkill myself\b", re.I),
-    re.compile(r"\bi want to die\b", re.I),
-    re.compile(r"\bsuicid(e|al)?\b", re.I),
-    re.compile(r"\bi can't go on\b", re.I),
-    re.compile(r"\bending it all\b", re.I),
-    re.compile(r"\bwant to end my life\b", re.I),
+    r"kill myself",
+    r"i want to die",
+    r"suicid(?:e|al)?",
+    r"i can't go on",
+    r"ending it all",
+    r"want to end my life",
 ]
+CRISIS_RE = re.compile(r"\b(?:" + "|".join(f"(?:{p})" for p in CRISIS_PATTERNS) + r")\b", re.I)
+# Substrings at least one of which appears in any CRISIS_RE match; a cheap `in` check rules out most text.
+_CRISIS_HINTS = ("kill", "die", "suicid", "go on", "ending it", "end my life")
+# casefold() leaves these apart from "i" although re.I matches them: dotless ı stays ı, İ becomes "i" + U+0307
+_CRISIS_FOLD = {0x131: "i", 0x307: None}
 DEFAULT_HELPLINE = {"IN": "+91-8888817666", "US": "988 / 1-800-273-8255", "UK": "Samaritans / 116 123"}
+_DEFAULT_HELPLINE_US = DEFAULT_HELPLINE["US"]
+
+def lookup_helpline(country_code: Optional[str]) -> str:
+    return DEFAULT_HELPLINE.get(country_code.upper(), _DEFAULT_HELPLINE_US) if country_code else _DEFAULT_HELPLINE_US
 
 SYSTEM_PROMPT = (
     "You are Empath — a supportive, empathic, private AI companion. "
@@ -70,15 +142,41 @@ SYSTEM_PROMPT = (
     "Avoid labels, avoid instructions to self-harm, and prioritize safety: if the user expresses imminent danger, instruct them to contact local emergency services and offer a helpline. "
     "Be warm, non-judgmental, concise, and follow-up friendly."
 )
+# text_generation prompt template, split around the user message
+_PROMPT_PREFIX = SYSTEM_PROMPT + "\n\nUser: "
+_PROMPT_SUFFIX = "\n\nAssistant:"
 
 
 def detect_crisis(text: Optional[str]) -> bool:
     if not text:
         return False
-    for rgx in CRISIS_PATTERNS:
-        if rgx.search(text):
-            return True
-    return False
+    # short messages repeat often (canned UI prompts, retries); long replies would just churn the cache
+    if len(text) < 512:
+        return _detect_crisis_cached(text)
+    return _detect_crisis_uncached(text)
+
+# Longest pattern source, which is >= the longest text any pattern can match
+_CRISIS_WINDOW = max(len(p) for p in CRISIS_PATTERNS)
+
+def detect_crisis_tail(text: str, new_chars: int) -> bool:
+    """
+    Incremental detect_crisis for text that grows at the end (streamed replies): only matches that end
+    in the last new_chars characters are new, so scan just that tail plus _CRISIS_WINDOW of context.
+    Bypasses the lru cache, which every streamed prefix would otherwise churn.
+    """
+    return _detect_crisis_uncached(text, max(0, len(text) - new_chars - _CRISIS_WINDOW))
+
+@functools.lru_cache(maxsize=4096)
+def _detect_crisis_cached(text: str) -> bool:
+    return _detect_crisis_uncached(text)
+
+def _detect_crisis_uncached(text: str, pos: int = 0) -> bool:
+    # casefold (not lower) plus _CRISIS_FOLD so the pre-filter accepts everything re.I can match
+    low = text[pos:].casefold().translate(_CRISIS_FOLD)
+    if not any(h in low for h in _CRISIS_HINTS):
+        return False
+    # search from pos rather than slicing: \b at pos still sees the preceding character
+    return CRISIS_RE.search(text, pos) is not None
 
 # --------------------
 # InferenceClient (provider-only) - signature-aware conversational fallback
@@ -93,16 +191,44 @@ except Exception as e:
     hf_inference_client_import_error = str(e)
     logger.exception("huggingface_hub.InferenceClient import failed: %s", hf_inference_client_import_error)
 
+# modern huggingface_hub exposes chat_completion directly; lets try_chat_methods skip reflective probing
+_HAS_CHAT_COMPLETION = InferenceClient is not None and hasattr(InferenceClient, "chat_completion")
+
+def _detect_textgen_kw() -> str:
+    # older clients named the prompt parameter "inputs"; newer ones use "prompt"
+    try:
+        if "inputs" in inspect.signature(InferenceClient.text_generation).parameters:
+            return "inputs"
+    except Exception:
+        pass
+    return "prompt"
+
+_TEXTGEN_KW = _detect_textgen_kw() if InferenceClient is not None else "prompt"
+
 def extract_text_from_response(resp: Any) -> str:
     """
     Extract only the assistant's reply text from provider responses.
+    Fast path for typed chat_completion outputs (ChatCompletionOutput); anything else goes through
+    _extract_text_slow.
+    """
+    if hasattr(resp, "choices"):
+        try:
+            content = resp.choices[0].message.content
+            if isinstance(content, str):
+                return content.strip()
+        except (AttributeError, IndexError, KeyError, TypeError):
+            pass
+    return _extract_text_slow(resp)
+
+def _extract_text_slow(resp: Any) -> str:
+    """
     Supports both dicts and stringified JSON with a 'choices[0].message.content' field.
     """
     try:
         # If the response is a JSON string, parse it
         if isinstance(resp, str):
             try:
-                resp = json.loads(resp)
+                resp = _json_loads(resp)
             except Exception:
                 return resp.strip()
 
@@ -139,28 +265,31 @@ def try_text_generation(client: Any, model_id: str, prompt: str, max_new_tokens:
     Attempt text_generation call on client. Raise RuntimeError on failure.
     """
     try:
-        return client.text_generation(model=model_id, inputs=prompt, max_new_tokens=max_new_tokens, temperature=temperature)
-    except TypeError:
-        return client.text_generation(model=model_id, prompt=prompt, max_new_tokens=max_new_tokens, temperature=temperature)
+        return client.text_generation(model=model_id, max_new_tokens=max_new_tokens, temperature=temperature, **{_TEXTGEN_KW: prompt})
     except Exception as e:
         raise RuntimeError(f"Text-generation failed: {e}")
 
-def _build_payload_for_signature(payload: Dict[str, Any], sig: inspect.Signature) -> Dict[str, Any]:
+@functools.lru_cache(maxsize=512)
+def _cached_sig(fn: Callable) -> Tuple[str, ...]:
     """
-    Given a payload dict and a callable signature, build a kwargs dict containing only the parameters
-    the callable accepts (excluding 'self' / 'cls').
+    Return the parameter names fn accepts (excluding 'self' / 'cls'), memoized per callable so
+    inspect.signature is not re-parsed on every request.
     """
-    params = []
-    for name, param in sig.parameters.items():
-        # skip 'self' and 'cls' (bound methods)
-        if name in ("self", "cls"):
-            continue
-        params.append(name)
-    filtered = {}
-    for p in params:
-        if p in payload:
-            filtered[p] = payload[p]
-    return filtered
+    return tuple(name for name in inspect.signature(fn).parameters if name not in ("self", "cls"))
+
+def _signature_params(fn: Callable) -> Tuple[str, ...]:
+    try:
+        return _cached_sig(fn)
+    except TypeError:
+        # unhashable callables can't be memoized; inspect directly
+        return _cached_sig.__wrapped__(fn)
+
+def _build_payload_for_signature(payload: Dict[str, Any], params: Tuple[str, ...]) -> Dict[str, Any]:
+    """
+    Given a payload dict and the parameter names a callable accepts, build a kwargs dict containing
+    only those parameters.
+    """
+    return {p: payload[p] for p in params if p in payload}
 
 def try_invoke_callable_with_signature(fn: Callable, payload: Dict[str, Any], pos_args: List[Any]):
     """
@@ -171,8 +300,8 @@ def try_invoke_callable_with_signature(fn: Callable, payload: Dict[str, Any], po
     """
     last_exc = None
     try:
-        sig = inspect.signature(fn)
-        kwargs = _build_payload_for_signature(payload, sig)
+        params = _signature_params(fn)
+        kwargs = _build_payload_for_signature(payload, params)
         if kwargs:
             try:
                 return fn(**kwargs)
@@ -228,6 +357,25 @@ def try_invoke_proxy_method(method_obj: Any, payload: Dict[str, Any], pos_args:
 
     raise RuntimeError(f"Proxy invocation failed. Last error: {last_exc}")
 
+# (id(client), model_id) -> index into try_chat_methods candidates that last succeeded
+_CHAT_METHOD_CACHE: Dict[Tuple[int, str], int] = {}
+
+_CHAT_METHOD_NAMES = ("chat", "conversational", "chat_completion")
+# id(client) -> (chat method names the client has, dir() attrs that look like chat methods)
+_CLIENT_CHAT_ATTRS: Dict[int, Tuple[frozenset, Tuple[str, ...]]] = {}
+
+def _client_chat_attrs(client: Any) -> Tuple[frozenset, Tuple[str, ...]]:
+    """
+    Scan client once for chat-like attributes. Per instance rather than per class, since some clients
+    attach proxies such as `chat` in __init__; safe to key by id() because clients live in _CLIENT_CACHE.
+    """
+    attrs = _CLIENT_CHAT_ATTRS.get(id(client))
+    if attrs is None:
+        present = frozenset(name for name in _CHAT_METHOD_NAMES if hasattr(client, name))
+        fallback = tuple(a for a in dir(client) if a.lower() in _CHAT_METHOD_NAMES)
+        attrs = _CLIENT_CHAT_ATTRS.setdefault(id(client), (present, fallback))
+    return attrs
+
 def try_chat_methods(client: Any, model_id: str, system_prompt: str, user_text: str, max_new_tokens: int, temperature: float):
     """
     Try several conversational/chat method names in order (chat, conversational, chat_completion).
@@ -237,6 +385,13 @@ def try_chat_methods(client: Any, model_id: str, system_prompt: str, user_text:
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_text},
     ]
+    # Fast path: call chat_completion directly; only fall back to probing if the call shape doesn't fit
+    if _HAS_CHAT_COMPLETION:
+        try:
+            return client.chat_completion(model=model_id, messages=messages, max_tokens=max_new_tokens, temperature=temperature)
+        except (TypeError, AttributeError) as e:
+            logger.debug("chat_completion fast path failed, probing chat methods: %s", e)
+
     # candidate method names and payload shapes to try (ordered)
     candidates = [
         ("chat", {"model": model_id, "messages": messages, "max_new_tokens": max_new_tokens, "temperature": temperature}),
@@ -246,39 +401,64 @@ def try_chat_methods(client: Any, model_id: str, system_prompt: str, user_text:
         ("chat", {"model": model_id, "inputs": user_text, "system_prompt": system_prompt, "max_new_tokens": max_new_tokens, "temperature": temperature}),
     ]
 
+    cache_key = (id(client), model_id)
+    order = list(range(len(candidates)))
+    cached_idx = _CHAT_METHOD_CACHE.get(cache_key)
+    if cached_idx is not None:
+        # try the previously successful candidate first, then the rest in the usual order
+        order.remove(cached_idx)
+        order.insert(0, cached_idx)
+
+    present, fallback_attrs = _client_chat_attrs(client)
+
     last_err = None
-    for method_name, payload in candidates:
-        if hasattr(client, method_name):
+    for idx in order:
+        method_name, payload = candidates[idx]
+        if method_name in present:
             method_obj = getattr(client, method_name)
             pos_args = [model_id, messages]
             try:
                 resp = try_invoke_proxy_method(method_obj, payload, pos_args)
+                _CHAT_METHOD_CACHE[cache_key] = idx
                 return resp
             except Exception as e:
                 last_err = e
                 logger.debug("Method %s failed: %s", method_name, e)
+                if idx == cached_idx:
+                    _CHAT_METHOD_CACHE.pop(cache_key, None)
                 continue
 
     # If none of the named methods worked, try attributes on client that look like chat methods
-    for fallback_attr in dir(client):
-        if fallback_attr.lower() in ("chat", "conversational", "chat_completion"):
-            method_obj = getattr(client, fallback_attr)
-            pos_args = [model_id, messages]
-            payload = {"model": model_id, "messages": messages, "max_new_tokens": max_new_tokens, "temperature": temperature}
-            try:
-                resp = try_invoke_proxy_method(method_obj, payload, pos_args)
-                return resp
-            except Exception as e:
-                last_err = e
-                logger.debug("Fallback attr '%s' invocation failed: %s", fallback_attr, e)
-                continue
+    for fallback_attr in fallback_attrs:
+        method_obj = getattr(client, fallback_attr)
+        pos_args = [model_id, messages]
+        payload = {"model": model_id, "messages": messages, "max_new_tokens": max_new_tokens, "temperature": temperature}
+        try:
+            resp = try_invoke_proxy_method(method_obj, payload, pos_args)
+            return resp
+        except Exception as e:
+            last_err = e
+            logger.debug("Fallback attr '%s' invocation failed: %s", fallback_attr, e)
+            continue
 
     # If none worked
     raise RuntimeError(f"No conversational/chat method succeeded on InferenceClient. Last error: {last_err}")
 
+# provider -> InferenceClient, reused across requests so HTTP sessions/connections are kept alive
+_CLIENT_CACHE: Dict[Optional[str], Any] = {}
+
+def _get_client(provider: Optional[str]) -> Any:
+    client = _CLIENT_CACHE.get(provider)
+    if client is None:
+        client_kwargs = {"api_key": HF_TOKEN}
+        if provider:
+            client_kwargs["provider"] = provider
+        client = _CLIENT_CACHE.setdefault(provider, InferenceClient(**client_kwargs))
+    return client
+
 def call_model_with_inference_client(model_id: str, prompt: str, user_text: str, max_new_tokens: int, temperature: float) -> str:
     """
-    Top-level: construct InferenceClient and attempt text_generation; if the provider says conversational-only,
+    Top-level: get the shared InferenceClient and attempt text_generation; if the provider says conversational-only,
     fall back to chat-style methods using signature-aware invocation. Returns extracted text or raises RuntimeError.
     """
     if not HF_TOKEN:
@@ -287,12 +467,8 @@ def call_model_with_inference_client(model_id: str, prompt: str, user_text: str,
     if not HF_INFERENCECLIENT_AVAILABLE:
         raise RuntimeError(f"InferenceClient not available: {hf_inference_client_import_error}. Install huggingface-hub>=0.15.*")
 
-    client_kwargs = {"api_key": HF_TOKEN}
-    if HF_INFERENCE_PROVIDER:
-        client_kwargs["provider"] = HF_INFERENCE_PROVIDER
-
     try:
-        client = InferenceClient(**client_kwargs)
+        client = _get_client(HF_INFERENCE_PROVIDER)
     except Exception as e:
         raise RuntimeError(f"Failed to construct InferenceClient: {e}")
 
@@ -321,17 +497,93 @@ def call_model_with_inference_client(model_id: str, prompt: str, user_text: str,
         # otherwise re-raise original error
         raise RuntimeError(err_msg)
 
+def stream_chat_completion(model_id: str, user_text: str, max_new_tokens: int, temperature: float):
+    """
+    Start a streaming chat_completion on the shared InferenceClient and return its chunk iterator.
+    Streaming has no text_generation / probing fallback; raises RuntimeError if it can't be started.
+    """
+    if not HF_TOKEN:
+        raise RuntimeError("HF_TOKEN (or HF_API_TOKEN) not set in environment.")
+
+    if not HF_INFERENCECLIENT_AVAILABLE:
+        raise RuntimeError(f"InferenceClient not available: {hf_inference_client_import_error}. Install huggingface-hub>=0.15.*")
+
+    if not _HAS_CHAT_COMPLETION:
+        raise RuntimeError("Streaming requires InferenceClient.chat_completion. Upgrade huggingface-hub.")
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_text},
+    ]
+    try:
+        client = _get_client(HF_INFERENCE_PROVIDER)
+        return client.chat_completion(model=model_id, messages=messages, max_tokens=max_new_tokens, temperature=temperature, stream=True)
+    except Exception as e:
+        raise RuntimeError(f"Streaming chat_completion failed: {e}")
+
+# --------------------
+# Response cache (deterministic generations only)
+# --------------------
+try:
+    from cachetools import TTLCache
+    _RESP_CACHE = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+except Exception as e:
+    _RESP_CACHE = None
+    logger.info("cachetools unavailable, response cache disabled: %s", e)
+_RESP_CACHE_LOCK = threading.Lock()
+
+def _response_cache_key(model_id: str, prompt: str) -> bytes:
+    return hashlib.blake2b((model_id + "\x00" + prompt).encode("utf-8"), digest_size=16).digest()
+
+def _response_cache_enabled() -> bool:
+    # sampled output (temperature > 0) must not be replayed
+    return _RESP_CACHE is not None and MODEL_TEMPERATURE == 0
+
+# --------------------
+# In-flight request coalescing
+# --------------------
+# Concurrent requests for the same (model, prompt) share one upstream call: the first request runs it,
+# the rest wait on its Future. The provider has no batched chat API, so this is where overlap pays off.
+_INFLIGHT: Dict[bytes, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+def generate_coalesced(key: bytes, model_id: str, prompt: str, user_text: str, max_new_tokens: int, temperature: float) -> str:
+    with _INFLIGHT_LOCK:
+        fut = _INFLIGHT.get(key)
+        leader = fut is None
+        if leader:
+            fut = Future()
+            _INFLIGHT[key] = fut
+    if not leader:
+        logger.info("Joining in-flight request for model %s", model_id)
+        return fut.result(timeout=INFLIGHT_WAIT_TIMEOUT)
+
+    try:
+        result = call_model_with_inference_client(model_id, prompt, user_text, max_new_tokens, temperature)
+        fut.set_result(result)
+        return result
+    except Exception as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+
 # --------------------
 # HTTP endpoints
 # --------------------
 @app.before_request
 def log_request():
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     try:
         logger.debug("REQUEST %s %s from %s", request.method, request.path, request.remote_addr)
-        logger.debug("Headers: %s", json.dumps({k: v for k, v in request.headers.items()}))
-        b = request.get_data(as_text=True)
-        if b:
-            logger.debug("Body: %s", b[:2000])
+        logger.debug("Headers: %s", request.headers)
+        # only read small bodies; large ones would be buffered into memory just for logging
+        if request.content_length and request.content_length < 4096:
+            b = request.get_data(as_text=True)
+            if b:
+                logger.debug("Body: %s", b[:2000])
     except Exception:
         logger.exception("Error logging request")
 
@@ -355,45 +607,76 @@ def debug_env():
         "DEBUG_MODE": DEBUG_MODE
     }), 200
 
-@app.route("/api/chat", methods=["POST"])
-def chat_endpoint():
+FALLBACK_REPLY_TEXT = "Hi — I'm here. I can't reach a hosted model right now. Would you like a short breathing exercise?"
+
+def crisis_reply(country_code: Optional[str]) -> str:
+    """Reply sent instead of calling the model when the user's message trips the crisis check."""
+    helpline = lookup_helpline(country_code)
+    return "I'm really sorry you're feeling this way. If you're in immediate danger, please call your local emergency number now. " + f"You can also contact this helpline for support: {helpline}."
+
+def unsafe_reply_fallback(country_code: Optional[str]) -> str:
+    """Reply sent in place of model output that trips the crisis check."""
+    helpline = lookup_helpline(country_code)
+    return "I detect content that could indicate you might be in danger. If you're in immediate danger, call your local emergency number now. " + f"You can also contact this helpline: {helpline}."
+
+def parse_chat_request():
+    """
+    Validate a chat POST body. Returns (fields, None) with fields "text", "country_code", "model",
+    or (None, error_response) ready to return from the view.
+    """
     if not request.is_json:
-        return jsonify({"error": "Content-Type must be application/json"}), 400
+        return None, (jsonify({"error": "Content-Type must be application/json"}), 400)
     body = request.get_json(silent=True)
     if not body:
-        return jsonify({"error": "invalid json body"}), 400
+        return None, (jsonify({"error": "invalid json body"}), 400)
 
     message = body.get("message", "")
-    country_code = body.get("countryCode")
-    model_override = body.get("model")  # optional per-request model id
     text = (message or "").strip()
     if not text:
-        return jsonify({"error": "message required"}), 400
+        return None, (jsonify({"error": "message required"}), 400)
+
+    chosen_model = body.get("model") or DEFAULT_MODEL  # optional per-request model id
+    if not chosen_model:
+        return None, (jsonify({"error": "no model configured"}), 500)
+
+    return {"text": text, "country_code": body.get("countryCode"), "model": chosen_model}, None
+
+@app.route("/api/chat", methods=["POST"])
+def chat_endpoint():
+    fields, error = parse_chat_request()
+    if error:
+        return error
+    text, country_code, chosen_model = fields["text"], fields["country_code"], fields["model"]
 
     # Crisis pre-check
     if detect_crisis(text):
-        helpline = DEFAULT_HELPLINE.get((country_code or "").upper(), DEFAULT_HELPLINE.get("US"))
-        reply = "I'm really sorry you're feeling this way. If you're in immediate danger, please call your local emergency number now. " + f"You can also contact this helpline for support: {helpline}."
-        return jsonify({"role": "bot", "text": reply, "crisis": True}), 200
+        return jsonify({"role": "bot", "text": crisis_reply(country_code), "crisis": True}), 200
 
     # Dev-mode canned reply (if enabled)
     if FALLBACK_REPLY:
         logger.info("FALLBACK_REPLY enabled — returning canned reply")
-        raw = "Hi — I'm here. I can't reach a hosted model right now. Would you like a short breathing exercise?"
-        return jsonify({"role": "bot", "text": raw, "crisis": False}), 200
-
-    chosen_model = model_override or DEFAULT_MODEL
-    if not chosen_model:
-        return jsonify({"error": "no model configured"}), 500
+        return jsonify({"role": "bot", "text": FALLBACK_REPLY_TEXT, "crisis": False}), 200
 
     # Compose system+user prompt
-    prompt = f"{SYSTEM_PROMPT}\n\nUser: {text}\n\nAssistant:"
+    prompt = "".join((_PROMPT_PREFIX, text, _PROMPT_SUFFIX))
+
+    cache_key = _response_cache_key(chosen_model, prompt)
+    generated = None
+    if _response_cache_enabled():
+        with _RESP_CACHE_LOCK:
+            generated = _RESP_CACHE.get(cache_key)
+        if generated is not None:
+            logger.info("Response cache hit for model %s (len result=%d)", chosen_model, len(generated))
 
     # Call hosted model (with robust fallback)
     try:
-        logger.info("Calling hosted model %s (provider=%s) for request length=%d", chosen_model, HF_INFERENCE_PROVIDER, len(text))
-        generated = call_model_with_inference_client(chosen_model, prompt, text, MODEL_MAX_NEW_TOKENS, MODEL_TEMPERATURE)
-        logger.info("Hosted model call completed (len result=%d)", len(generated))
+        if generated is None:
+            logger.info("Calling hosted model %s (provider=%s) for request length=%d", chosen_model, HF_INFERENCE_PROVIDER, len(text))
+            generated = generate_coalesced(cache_key, chosen_model, prompt, text, MODEL_MAX_NEW_TOKENS, MODEL_TEMPERATURE)
+            logger.info("Hosted model call completed (len result=%d)", len(generated))
+            if _response_cache_enabled():
+                with _RESP_CACHE_LOCK:
+                    _RESP_CACHE[cache_key] = generated
     except Exception as e:
         err_str = str(e)
         logger.exception("Hosted model call failed: %s", err_str)
@@ -414,16 +697,89 @@ def chat_endpoint():
             "guidance": guidance
         }), 502
 
+    generated = generated.strip()
+
     # Post-check crisis detection on reply
     if detect_crisis(generated):
-        helpline = DEFAULT_HELPLINE.get((country_code or "").upper(), DEFAULT_HELPLINE.get("US"))
-        fallback = "I detect content that could indicate you might be in danger. If you're in immediate danger, call your local emergency number now. " + f"You can also contact this helpline: {helpline}."
-        return jsonify({"role": "bot", "text": fallback, "crisis": True}), 200
+        return jsonify({"role": "bot", "text": unsafe_reply_fallback(country_code), "crisis": True}), 200
+
+    return jsonify({"role": "bot", "text": generated, "crisis": False}), 200
+
+def _sse_event(payload: Dict[str, Any]) -> str:
+    return f"data: {app.json.dumps(payload)}\n\n"
+
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream_endpoint():
+    """
+    Server-sent events variant of /api/chat. Emits {"delta": ...} events as tokens arrive and a final
+    {"done": true, "crisis": ...} event. Each delta is crisis-checked before it is forwarded; on a hit
+    the stream stops and the final event carries the replacement "text".
+    """
+    fields, error = parse_chat_request()
+    if error:
+        return error
+    text, country_code, chosen_model = fields["text"], fields["country_code"], fields["model"]
+
+    # Crisis pre-check
+    if detect_crisis(text):
+        return Response(_sse_event({"done": True, "role": "bot", "text": crisis_reply(country_code), "crisis": True}), mimetype="text/event-stream")
 
-    return jsonify({"role": "bot", "text": generated.strip(), "crisis": False}), 200
+    if FALLBACK_REPLY:
+        logger.info("FALLBACK_REPLY enabled — returning canned reply")
+        return Response(_sse_event({"done": True, "role": "bot", "text": FALLBACK_REPLY_TEXT, "crisis": False}), mimetype="text/event-stream")
+
+    try:
+        logger.info("Streaming hosted model %s (provider=%s) for request length=%d", chosen_model, HF_INFERENCE_PROVIDER, len(text))
+        chunks = stream_chat_completion(chosen_model, text, MODEL_MAX_NEW_TOKENS, MODEL_TEMPERATURE)
+    except Exception as e:
+        logger.exception("Hosted model stream failed to start: %s", e)
+        return jsonify({"error": "upstream_inference_failed", "detail": str(e)}), 502
+
+    def generate():
+        generated = ""
+        try:
+            for chunk in chunks:
+                choices = getattr(chunk, "choices", None)
+                delta = choices[0].delta.content if choices else None
+                if not delta:
+                    continue
+                generated += delta
+                # Post-check crisis detection before forwarding; only the tail can hold a new match
+                if detect_crisis_tail(generated, len(delta)):
+                    logger.info("Crisis content in stream after %d chars; stopping generation", len(generated))
+                    yield _sse_event({"done": True, "role": "bot", "text": unsafe_reply_fallback(country_code), "crisis": True})
+                    return
+                yield _sse_event({"delta": delta})
+        except GeneratorExit:
+            # client went away; closing the upstream iterator below stops generation
+            logger.info("Client disconnected from stream after %d chars", len(generated))
+            raise
+        except Exception as e:
+            logger.exception("Hosted model stream failed: %s", e)
+            yield _sse_event({"error": "upstream_inference_failed", "detail": str(e)})
+            return
+        finally:
+            close = getattr(chunks, "close", None)
+            if callable(close):
+                close()
+
+        logger.info("Hosted model stream completed (len result=%d)", len(generated))
+        yield _sse_event({"done": True, "role": "bot", "crisis": False})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ASGI entrypoint: `uvicorn app:asgi_app --workers N`. a2wsgi runs each request on its own thread from a
+# pool of ASGI_THREADS per worker, so slow HF requests (and long streams) overlap instead of serializing.
+try:
+    from a2wsgi import WSGIMiddleware
+    asgi_app = WSGIMiddleware(app, workers=ASGI_THREADS)
+except Exception as e:
+    asgi_app = None
+    logger.debug("a2wsgi unavailable, ASGI entrypoint disabled: %s", e)
 
+# Development only. In production run `gunicorn -c gunicorn.conf.py app:app` (gevent workers).
 if __name__ == "__main__":
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "5000"))
-    logger.info("Starting Flask (provider-only) on %s:%s", host, port)
+    logger.info("Starting Flask dev server (provider-only) on %s:%s", host, port)
     app.run(host=host, port=port, debug=False, use_reloader=False)
@@ -0,0 +1,12 @@
+# gunicorn.conf.py - production server config: `gunicorn -c gunicorn.conf.py app:app`
+# gevent workers yield while waiting on the HF HTTPS call, so one worker serves many in-flight chats.
+# The gevent worker monkey-patches sockets/threading itself before loading app.py.
+
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+worker_class = "gevent"
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "200"))
+# generations can take well over gunicorn's 30s default
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
@@ -0,0 +1,83 @@
+import os
+import re
+import sys
+
+os.environ.setdefault("LOGFILE", os.devnull)
+
+from app import CRISIS_RE, detect_crisis, detect_crisis_tail
+
+PHRASES = [
+    "kill myself",
+    "i want to die",
+    "suicide",
+    "suicidal",
+    "i can't go on",
+    "ending it all",
+    "want to end my life",
+]
+
+
+def _case_variants():
+    """Map each ASCII letter used in PHRASES to every code point re.I treats as equal to it."""
+    letters = sorted({c for p in PHRASES for c in p if c.isalpha()})
+    any_letter = re.compile("[" + "".join(letters) + "]", re.I)
+    variants = {c: [] for c in letters}
+    for cp in range(sys.maxunicode + 1):
+        ch = chr(cp)
+        if any_letter.fullmatch(ch):
+            for c in letters:
+                if ch != c and re.fullmatch(c, ch, re.I):
+                    variants[c].append(ch)
+    return variants
+
+
+def test_detects_phrases():
+    for phrase in PHRASES:
+        assert detect_crisis(f"Lately {phrase}.")
+        assert detect_crisis(phrase.upper())
+
+
+def test_ignores_ordinary_text():
+    assert not detect_crisis("")
+    assert not detect_crisis(None)
+    assert not detect_crisis("I had a long day at work")
+    assert not detect_crisis("kill myselfish")
+
+
+def test_prefilter_never_rejects_regex_matches():
+    variants = _case_variants()
+    for phrase in PHRASES:
+        for i, c in enumerate(phrase):
+            for ch in variants.get(c, ()):
+                text = phrase[:i] + ch + phrase[i + 1:]
+                assert detect_crisis(text) == (CRISIS_RE.search(text) is not None), repr(text)
+
+
+def test_turkish_i_variants():
+    for text in ("suıcıde", "I want to dıe", "kıll myself", "SUİCİDE"):
+        assert CRISIS_RE.search(text)
+        assert detect_crisis(text), repr(text)
+
+
+def _streamed(text, size):
+    """Feed text to detect_crisis_tail in chunks of size chars; True if any chunk trips it."""
+    acc = ""
+    for i in range(0, len(text), size):
+        delta = text[i:i + size]
+        acc += delta
+        if detect_crisis_tail(acc, len(delta)):
+            return True
+    return False
+
+
+def test_tail_detects_phrases_split_across_chunks():
+    filler = "It has been a long week and honestly " * 5
+    for phrase in PHRASES:
+        for size in (1, 3, 7, 64):
+            assert _streamed(filler + phrase + " lately.", size), (phrase, size)
+
+
+def test_tail_ignores_ordinary_text():
+    text = "I skill myself up at the gym, and we are going on a trip. " * 10
+    for size in (1, 3, 7, 64):
+        assert not _streamed(text, size)